@@ -0,0 +1,438 @@
+import os
+import json
+import uuid
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pandas as pd
+
+# Default location of the archive, relative to the project directory that
+# run_stock_agent.sh changes into before running the agent.
+DEFAULT_ARCHIVE_DIR = "archive"
+TICKER_INDEX_FILE = "ticker_index.json"
+LOCK_FILE = ".lock"
+PARTITION_PREFIX = "date="
+COMPACTED_PREFIX = "part-compacted-"
+MANIFEST_SUFFIX = ".manifest.json"
+
+ARCHIVE_COLUMNS = [
+    'run_at', 'date', 'ticker', 'exchange', 'recommendation', 'rsi',
+    'current_price', 'price_change', 'percent_change', 'high_52week',
+    'low_52week', 'avg_volume', 'news_summary', 'report', 'error'
+]
+
+@contextmanager
+def _archive_lock(archive_dir):
+    """
+    Holds an exclusive lock on the archive so that overlapping runs (launchd plus a manual run)
+    never interleave updates of the ticker index or a compaction.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    with open(os.path.join(archive_dir, LOCK_FILE), 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _partition_dir(archive_dir, date_str):
+    return os.path.join(archive_dir, f"{PARTITION_PREFIX}{date_str}")
+
+def _list_partitions(archive_dir):
+    """
+    Returns the sorted list of partition dates (as 'YYYY-MM-DD' strings) present in the archive.
+    """
+    if not os.path.isdir(archive_dir):
+        return []
+    dates = []
+    for name in os.listdir(archive_dir):
+        if name.startswith(PARTITION_PREFIX) and os.path.isdir(os.path.join(archive_dir, name)):
+            dates.append(name[len(PARTITION_PREFIX):])
+    return sorted(dates)
+
+def _covered_part_names(partition_path):
+    """
+    Returns the names of part files already merged into a compacted file of this partition.
+    A manifest only counts once its compacted file exists, i.e. once the compaction completed.
+    """
+    covered = set()
+    for name in os.listdir(partition_path):
+        if not name.endswith(MANIFEST_SUFFIX):
+            continue
+        compacted_name = name[:-len(MANIFEST_SUFFIX)] + ".parquet"
+        if not os.path.exists(os.path.join(partition_path, compacted_name)):
+            continue
+        with open(os.path.join(partition_path, name), 'r') as f:
+            covered.update(json.load(f))
+    return covered
+
+def _list_part_files(partition_path):
+    """
+    Returns the part files of a partition that hold live data, skipping any part file left behind
+    by a compaction that was interrupted after writing its merged file.
+    """
+    covered = _covered_part_names(partition_path)
+    return sorted(
+        os.path.join(partition_path, name)
+        for name in os.listdir(partition_path)
+        if name.endswith(".parquet") and name not in covered
+    )
+
+def _newest_part_mtime(archive_dir):
+    newest = 0.0
+    for date_str in _list_partitions(archive_dir):
+        partition_path = _partition_dir(archive_dir, date_str)
+        for name in os.listdir(partition_path):
+            if name.endswith(".parquet"):
+                newest = max(newest, os.path.getmtime(os.path.join(partition_path, name)))
+    return newest
+
+def _index_is_stale(archive_dir):
+    """
+    The index is stale when it is missing or older than the newest part file, e.g. because a run
+    died between writing its part file and saving the index.
+    """
+    path = os.path.join(archive_dir, TICKER_INDEX_FILE)
+    if not os.path.exists(path):
+        return bool(_list_partitions(archive_dir))
+    return _newest_part_mtime(archive_dir) > os.path.getmtime(path)
+
+def _read_ticker_index(archive_dir):
+    path = os.path.join(archive_dir, TICKER_INDEX_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_ticker_index(archive_dir, index):
+    # Write to a temporary file first so a crash never leaves a truncated index behind.
+    path = os.path.join(archive_dir, TICKER_INDEX_FILE)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _rebuild_ticker_index_locked(archive_dir):
+    index = {}
+    for date_str in _list_partitions(archive_dir):
+        for part_path in _list_part_files(_partition_dir(archive_dir, date_str)):
+            for ticker in pd.read_parquet(part_path, columns=['ticker'])['ticker'].unique():
+                dates = index.setdefault(ticker, [])
+                if date_str not in dates:
+                    dates.append(date_str)
+    _save_ticker_index(archive_dir, index)
+    return index
+
+def rebuild_ticker_index(archive_dir=DEFAULT_ARCHIVE_DIR):
+    """
+    Rebuilds the ticker index (ticker -> sorted list of partition dates) by scanning every partition.
+    Returns the rebuilt index.
+    """
+    with _archive_lock(archive_dir):
+        return _rebuild_ticker_index_locked(archive_dir)
+
+def _load_ticker_index(archive_dir):
+    """
+    Loads the ticker index, rebuilding it first when it is missing or out of date.
+    """
+    if _index_is_stale(archive_dir):
+        with _archive_lock(archive_dir):
+            # Another process may have refreshed it while we waited for the lock.
+            if _index_is_stale(archive_dir):
+                return _rebuild_ticker_index_locked(archive_dir)
+    return _read_ticker_index(archive_dir)
+
+def _bare_symbol(ticker):
+    # 'HDFCBANK.NS' -> 'HDFCBANK'
+    return ticker.rsplit('.', 1)[0] if '.' in ticker else ticker
+
+def _resolve_tickers(index, tickers):
+    """
+    Maps the requested tickers to the names they are archived under. An exact match wins;
+    otherwise a bare symbol such as 'HDFCBANK' resolves to every exchange-suffixed ticker
+    with that symbol (e.g. 'HDFCBANK.NS').
+    """
+    resolved = []
+    for ticker in tickers:
+        ticker = ticker.strip()
+        if ticker in index:
+            matches = [ticker]
+        else:
+            matches = sorted(t for t in index
+                             if t.upper() == ticker.upper() or _bare_symbol(t).upper() == ticker.upper())
+        for match in matches:
+            if match not in resolved:
+                resolved.append(match)
+    return resolved
+
+def _to_float(value):
+    if value is None:
+        return None
+    if hasattr(value, 'item'):
+        # numpy scalars and single-element pandas objects returned by yfinance
+        value = value.item() if getattr(value, 'size', 1) == 1 else value
+    return float(value)
+
+def _to_date_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    return value.strftime("%Y-%m-%d")
+
+def build_run_record(ticker, exchange, run_at, recommendation=None, rsi_value=None,
+                     analysis=None, news_summaries=None, report=None, error=None):
+    """
+    Builds one archive record for a ticker processed during a run.
+    'analysis' is the dictionary returned by analyze_stock(); it may be None when the run failed.
+    """
+    analysis = analysis or {}
+    if isinstance(news_summaries, list):
+        news_summaries = "\n".join(news_summaries)
+    avg_volume = analysis.get('avg_volume')
+    return {
+        'run_at': run_at,
+        'date': run_at.strftime("%Y-%m-%d"),
+        'ticker': ticker,
+        'exchange': exchange,
+        'recommendation': recommendation,
+        'rsi': _to_float(rsi_value),
+        'current_price': _to_float(analysis.get('current_price')),
+        'price_change': _to_float(analysis.get('price_change')),
+        'percent_change': _to_float(analysis.get('percent_change')),
+        'high_52week': _to_float(analysis.get('high_52week')),
+        'low_52week': _to_float(analysis.get('low_52week')),
+        'avg_volume': int(avg_volume) if avg_volume is not None else None,
+        'news_summary': news_summaries,
+        'report': report,
+        'error': error
+    }
+
+def append_run_records(records, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """
+    Appends the records of one run to the archive.
+
+    Records are grouped by their 'date' and each group is written as a new Parquet part file
+    under archive_dir/date=YYYY-MM-DD/. Existing files are never rewritten, so an interrupted
+    run can at worst lose its own records. The ticker index is updated afterwards.
+
+    Returns the list of part files written.
+    """
+    if not records:
+        return []
+    frame = pd.DataFrame(records, columns=ARCHIVE_COLUMNS)
+    frame['run_at'] = pd.to_datetime(frame['run_at'])
+
+    written = []
+    with _archive_lock(archive_dir):
+        index = _read_ticker_index(archive_dir)
+        if _index_is_stale(archive_dir):
+            index = _rebuild_ticker_index_locked(archive_dir)
+        for date_str, group in frame.groupby('date'):
+            partition_path = _partition_dir(archive_dir, date_str)
+            os.makedirs(partition_path, exist_ok=True)
+            part_name = f"part-{datetime.now().strftime('%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            part_path = os.path.join(partition_path, part_name)
+            tmp_path = f"{part_path}.tmp"
+            group.sort_values(['ticker', 'run_at']).to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, part_path)
+            written.append(part_path)
+
+            for ticker in group['ticker'].unique():
+                dates = index.setdefault(ticker, [])
+                if date_str not in dates:
+                    dates.append(date_str)
+                    dates.sort()
+        _save_ticker_index(archive_dir, index)
+    return written
+
+def _read_partition(archive_dir, date_str, columns=None, tickers=None):
+    partition_path = _partition_dir(archive_dir, date_str)
+    if not os.path.isdir(partition_path):
+        return []
+    filters = [('ticker', 'in', list(tickers))] if tickers else None
+    return [pd.read_parquet(part_path, columns=columns, filters=filters)
+            for part_path in _list_part_files(partition_path)]
+
+def _finish_frame(frames, columns):
+    if not frames:
+        return pd.DataFrame(columns=columns or ARCHIVE_COLUMNS)
+    result = pd.concat(frames, ignore_index=True)
+    return result.sort_values(['ticker', 'run_at']).reset_index(drop=True)
+
+def load_records(archive_dir=DEFAULT_ARCHIVE_DIR, tickers=None, start_date=None, end_date=None, columns=None):
+    """
+    Loads archived records, reading only the partitions that can contain matches.
+
+    Parameters:
+      - tickers: Optional list of tickers, either as archived ('HDFCBANK.NS') or as bare symbols
+        ('HDFCBANK'); partitions are pruned using the ticker index.
+      - start_date / end_date: Optional inclusive bounds ('YYYY-MM-DD' strings or date objects).
+      - columns: Optional list of columns to read; only those columns are loaded from disk.
+
+    Returns a DataFrame sorted by ticker and run time.
+    """
+    start_date = _to_date_str(start_date)
+    end_date = _to_date_str(end_date)
+
+    if tickers:
+        index = _load_ticker_index(archive_dir)
+        tickers = _resolve_tickers(index, tickers)
+        dates = sorted({d for t in tickers for d in index.get(t, [])})
+    else:
+        dates = _list_partitions(archive_dir)
+    dates = [d for d in dates
+             if (start_date is None or d >= start_date) and (end_date is None or d <= end_date)]
+
+    if columns is not None:
+        # The sort keys are always needed, even when the caller asks for a narrower projection.
+        columns = list(dict.fromkeys(list(columns) + ['ticker', 'run_at']))
+
+    frames = []
+    for date_str in dates:
+        frames.extend(_read_partition(archive_dir, date_str, columns, tickers))
+    return _finish_frame(frames, columns)
+
+def _latest_record_before(archive_dir, index, ticker, start_date, columns):
+    """
+    Returns the most recent record of 'ticker' with a recommendation dated before 'start_date',
+    as a one-row DataFrame, or None if there is none.
+    """
+    earlier_dates = [d for d in index.get(ticker, []) if d < start_date]
+    for date_str in reversed(earlier_dates):
+        frame = _finish_frame(_read_partition(archive_dir, date_str, columns, [ticker]), columns)
+        frame = frame.dropna(subset=['recommendation'])
+        if not frame.empty:
+            return frame.tail(1)
+    return None
+
+def find_transitions(ticker, to_recommendation, days=90, archive_dir=DEFAULT_ARCHIVE_DIR):
+    """
+    Returns the runs in the last 'days' days where the recommendation for 'ticker' changed to
+    'to_recommendation' (e.g. all Sell transitions for HDFCBANK in the last 90 days).
+    The last run before the window is used as the baseline, so a change on the first run
+    inside the window is reported too. The result includes a 'previous_recommendation' column.
+    """
+    start_date = _to_date_str((datetime.now() - timedelta(days=days)).date())
+    columns = ['date', 'recommendation', 'rsi', 'current_price']
+    history = load_records(archive_dir, tickers=[ticker], start_date=start_date, columns=columns)
+
+    index = _load_ticker_index(archive_dir)
+    frames = [history]
+    for resolved in _resolve_tickers(index, [ticker]):
+        baseline = _latest_record_before(archive_dir, index, resolved, start_date, history.columns.tolist())
+        if baseline is not None:
+            frames.append(baseline)
+    history = _finish_frame([f for f in frames if not f.empty], history.columns.tolist())
+
+    history = history.dropna(subset=['recommendation'])
+    history['previous_recommendation'] = history.groupby('ticker')['recommendation'].shift(1)
+    mask = ((history['date'] >= start_date)
+            & (history['recommendation'] == to_recommendation)
+            & history['previous_recommendation'].notna()
+            & (history['previous_recommendation'] != to_recommendation))
+    return history[mask].reset_index(drop=True)
+
+def signal_accuracy(archive_dir=DEFAULT_ARCHIVE_DIR, tickers=None, start_date=None, end_date=None):
+    """
+    Computes how often each ticker's recommendation was followed by a matching price move.
+
+    A Buy is counted as correct when the price at the next archived run for the same ticker is
+    higher, a Sell when it is lower. Hold signals, failed runs and the latest run of each ticker
+    (which has no outcome yet) are ignored.
+
+    Returns a DataFrame indexed by ticker with 'signals', 'correct' and 'accuracy' columns.
+    """
+    history = load_records(
+        archive_dir, tickers=tickers, start_date=start_date, end_date=end_date,
+        columns=['recommendation', 'current_price']
+    )
+    history = history.dropna(subset=['recommendation', 'current_price'])
+    history['next_price'] = history.groupby('ticker')['current_price'].shift(-1)
+    scored = history[history['recommendation'].isin(['Buy', 'Sell']) & history['next_price'].notna()].copy()
+    move = scored['next_price'] - scored['current_price']
+    scored['correct'] = (((scored['recommendation'] == 'Buy') & (move > 0))
+                         | ((scored['recommendation'] == 'Sell') & (move < 0)))
+    summary = scored.groupby('ticker').agg(signals=('correct', 'size'), correct=('correct', 'sum'))
+    summary['accuracy'] = (summary['correct'] / summary['signals']).round(4)
+    return summary
+
+def _remove_covered_parts(partition_path):
+    """
+    Deletes part files merged by a completed compaction, then the manifests that listed them.
+    """
+    for name in _covered_part_names(partition_path):
+        part_path = os.path.join(partition_path, name)
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    for name in os.listdir(partition_path):
+        if name.endswith(MANIFEST_SUFFIX):
+            os.remove(os.path.join(partition_path, name))
+
+def _compact_partition(partition_path):
+    """
+    Merges the live part files of one partition into a single file. Returns True if it did.
+
+    The manifest naming the inputs is written before the merged file, so if the process dies
+    before the inputs are deleted, readers skip them instead of seeing every row twice.
+    """
+    part_files = _list_part_files(partition_path)
+    if len(part_files) <= 1:
+        _remove_covered_parts(partition_path)
+        return False
+    input_names = sorted(os.path.basename(p) for p in part_files)
+    digest = hashlib.sha1("\n".join(input_names).encode('utf-8')).hexdigest()[:16]
+    compact_path = os.path.join(partition_path, f"{COMPACTED_PREFIX}{digest}.parquet")
+    manifest_path = compact_path[:-len(".parquet")] + MANIFEST_SUFFIX
+
+    with open(f"{manifest_path}.tmp", 'w') as f:
+        json.dump(input_names, f)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    merged = pd.concat([pd.read_parquet(p) for p in part_files], ignore_index=True)
+    merged = merged.drop_duplicates(subset=['ticker', 'run_at'])
+    merged = merged.sort_values(['ticker', 'run_at']).reset_index(drop=True)
+    merged.to_parquet(f"{compact_path}.tmp", index=False)
+    os.replace(f"{compact_path}.tmp", compact_path)
+
+    _remove_covered_parts(partition_path)
+    return True
+
+def compact_partitions(archive_dir=DEFAULT_ARCHIVE_DIR, older_than_days=7):
+    """
+    Merges the part files of every partition older than 'older_than_days' days into a single file.
+    Recent partitions, which may still receive appends, are left untouched.
+
+    Returns the list of partition dates that were compacted.
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime("%Y-%m-%d")
+    compacted = []
+    with _archive_lock(archive_dir):
+        index_was_fresh = not _index_is_stale(archive_dir)
+        for date_str in _list_partitions(archive_dir):
+            if date_str >= cutoff:
+                continue
+            if _compact_partition(_partition_dir(archive_dir, date_str)):
+                compacted.append(date_str)
+        if compacted and index_was_fresh:
+            # Compaction does not change which tickers live in which partition, so mark the
+            # index as current rather than forcing a rebuild on the next query.
+            os.utime(os.path.join(archive_dir, TICKER_INDEX_FILE))
+    return compacted
+
+def start_background_compaction(archive_dir=DEFAULT_ARCHIVE_DIR, older_than_days=7):
+    """
+    Runs compact_partitions() in a separate thread and returns the started thread.
+    Callers should join() it before exiting so that a compaction is never cut short.
+    """
+    def _run():
+        try:
+            compacted = compact_partitions(archive_dir, older_than_days)
+            if compacted:
+                print(f"Compacted {len(compacted)} archive partition(s).")
+        except Exception as exc:
+            print(f"[ERROR] Archive compaction failed: {exc}")
+
+    thread = threading.Thread(target=_run, name="archive-compaction")
+    thread.start()
+    return thread
@@ -8,6 +8,7 @@ import requests
 from imessage_sender import send_imessage  # Import the iMessage sender function
 from google_news import fetch_google_news_summary  # Import the Google Custom Search news summary function
 from bedrock_claude import summarize_news_with_claude  # Import the Claude summarizer function
+from signal_archive import DEFAULT_ARCHIVE_DIR, build_run_record, append_run_records, start_background_compaction
 
 # Replace with your actual Finnhub API key (free tier available) -- for reference only
 FINNHUB_API_KEY = ""
@@ -177,8 +178,10 @@ def analyze_stock(data):
 
 # -----------------------------------------------------------------------
 
-def main(tickers, mobile_number, exchange=None, google_api_key=None, google_cx=None):
+def main(tickers, mobile_number, exchange=None, google_api_key=None, google_cx=None, archive_dir=DEFAULT_ARCHIVE_DIR):
     print("Welcome to the Stock Market Agent!")
+    run_at = datetime.now()
+    archive_records = []
     
     # Determine the currency symbol based on the exchange.
     currency_mapping = {
@@ -235,6 +238,26 @@ def main(tickers, mobile_number, exchange=None, google_api_key=None, google_cx=N
             error_message = f"{ticker}: Error - {str(e)}\n"
             print(error_message.strip())
             report += error_message
+            archive_records.append(build_run_record(ticker, exchange, run_at, error=str(e)))
+            continue
+
+        # Archiving is kept separate from the report so that it can never alter what the user receives.
+        try:
+            archive_records.append(build_run_record(
+                ticker, exchange, run_at, recommendation=recommendation, rsi_value=rsi_value,
+                analysis=analysis, news_summaries=news_summaries, report=line.strip()
+            ))
+        except Exception as e:
+            print(f"[ERROR] Failed to build archive record for ticker '{ticker}': {e}")
+
+    # Archive the per-ticker records of this run, then compact old partitions in the background.
+    compaction_thread = None
+    if archive_dir:
+        try:
+            append_run_records(archive_records, archive_dir)
+            compaction_thread = start_background_compaction(archive_dir)
+        except Exception as e:
+            print(f"[ERROR] Failed to archive run records: {e}")
 
     # Send the compiled report via iMessage if a mobile number is provided.
     if mobile_number:
@@ -246,6 +269,9 @@ def main(tickers, mobile_number, exchange=None, google_api_key=None, google_cx=N
     else:
         print("No mobile number provided. Skipping iMessage sending.")
 
+    if compaction_thread:
+        compaction_thread.join()
+
 if __name__ == "__main__":
     # Read configuration from the provided file.
     if len(sys.argv) > 1:
@@ -256,6 +282,7 @@ if __name__ == "__main__":
         exchange = config.get('exchange', None)
         google_api_key = config.get('google_api_key', None)
         google_cx = config.get('google_cx', None)
+        archive_dir = config.get('archive_dir', DEFAULT_ARCHIVE_DIR)
     else:
         # Defaults if no config provided:
         tickers = ['RELIANCE', 'ITC', 'TCS', 'HDFCBANK', 'INFY']
@@ -263,5 +290,6 @@ if __name__ == "__main__":
         exchange = None
         google_api_key = None
         google_cx = None
+        archive_dir = DEFAULT_ARCHIVE_DIR
 
-    main(tickers, mobile_number, exchange, google_api_key, google_cx) 
\ No newline at end of file
+    main(tickers, mobile_number, exchange, google_api_key, google_cx, archive_dir) 
\ No newline at end of file
@@ -0,0 +1,120 @@
+import os
+from datetime import datetime, timedelta
+
+import signal_archive as sa
+
+
+def _record(ticker, days_ago, recommendation="Hold", price=100.0, error=None):
+    run_at = datetime.now() - timedelta(days=days_ago)
+    if error:
+        return sa.build_run_record(ticker, "nse", run_at, error=error)
+    return sa.build_run_record(
+        ticker, "nse", run_at, recommendation=recommendation, rsi_value=50.0,
+        analysis={'current_price': price, 'avg_volume': 1000}, report=f"{ticker}: {recommendation}"
+    )
+
+
+def _part_files(archive_dir):
+    return sorted(
+        os.path.join(root, name)
+        for root, _, names in os.walk(archive_dir)
+        for name in names if name.endswith(".parquet")
+    )
+
+
+def test_append_load_round_trip(tmp_path):
+    records = [_record("ITC.NS", 1, "Buy", 450.5), _record("TCS.NS", 1, "Sell", 3900.0)]
+    written = sa.append_run_records(records, str(tmp_path))
+
+    assert len(written) == 1
+    loaded = sa.load_records(str(tmp_path))
+    assert loaded['ticker'].tolist() == ["ITC.NS", "TCS.NS"]
+    assert loaded['recommendation'].tolist() == ["Buy", "Sell"]
+    assert loaded['current_price'].tolist() == [450.5, 3900.0]
+    assert loaded['avg_volume'].tolist() == [1000, 1000]
+
+
+def test_ticker_query_prunes_partitions_and_resolves_bare_symbol(tmp_path, monkeypatch):
+    sa.append_run_records([_record("ITC.NS", 10)], str(tmp_path))
+    sa.append_run_records([_record("HDFCBANK.NS", 5)], str(tmp_path))
+    sa.append_run_records([_record("ITC.NS", 1)], str(tmp_path))
+
+    read_dates = []
+    original = sa._read_partition
+
+    def tracking_read(archive_dir, date_str, *args, **kwargs):
+        read_dates.append(date_str)
+        return original(archive_dir, date_str, *args, **kwargs)
+
+    monkeypatch.setattr(sa, "_read_partition", tracking_read)
+    loaded = sa.load_records(str(tmp_path), tickers=["HDFCBANK"])
+
+    assert loaded['ticker'].tolist() == ["HDFCBANK.NS"]
+    assert read_dates == [(datetime.now() - timedelta(days=5)).strftime("%Y-%m-%d")]
+
+
+def test_missing_index_is_rebuilt(tmp_path):
+    sa.append_run_records([_record("ITC.NS", 3)], str(tmp_path))
+    os.remove(os.path.join(str(tmp_path), sa.TICKER_INDEX_FILE))
+
+    loaded = sa.load_records(str(tmp_path), tickers=["ITC.NS"])
+
+    assert loaded['ticker'].tolist() == ["ITC.NS"]
+    assert os.path.exists(os.path.join(str(tmp_path), sa.TICKER_INDEX_FILE))
+
+
+def test_transition_across_window_boundary(tmp_path):
+    sa.append_run_records([_record("X.NS", 95, "Buy")], str(tmp_path))
+    sa.append_run_records([_record("X.NS", 85, "Sell")], str(tmp_path))
+    sa.append_run_records([_record("X.NS", 80, "Sell")], str(tmp_path))
+
+    transitions = sa.find_transitions("X", "Sell", days=90, archive_dir=str(tmp_path))
+
+    assert len(transitions) == 1
+    assert transitions['previous_recommendation'].tolist() == ["Buy"]
+    assert transitions['date'].tolist() == [(datetime.now() - timedelta(days=85)).strftime("%Y-%m-%d")]
+
+
+def test_accuracy_ignores_error_rows(tmp_path):
+    runs = [
+        _record("ITC.NS", 4, "Buy", 100.0),
+        _record("ITC.NS", 3, error="No data available for analysis"),
+        _record("ITC.NS", 2, "Sell", 110.0),
+        _record("ITC.NS", 1, "Hold", 115.0),
+    ]
+    for run in runs:
+        sa.append_run_records([run], str(tmp_path))
+
+    accuracy = sa.signal_accuracy(str(tmp_path))
+
+    assert accuracy.loc["ITC.NS", 'signals'] == 2
+    assert accuracy.loc["ITC.NS", 'correct'] == 1
+    assert accuracy.loc["ITC.NS", 'accuracy'] == 0.5
+
+
+def test_compaction_is_idempotent(tmp_path):
+    for _ in range(3):
+        sa.append_run_records([_record("ITC.NS", 30), _record("TCS.NS", 30)], str(tmp_path))
+    before = sa.load_records(str(tmp_path))
+
+    assert len(sa.compact_partitions(str(tmp_path))) == 1
+    assert sa.compact_partitions(str(tmp_path)) == []
+    assert len(_part_files(str(tmp_path))) == 1
+    after = sa.load_records(str(tmp_path))
+    assert len(after) == len(before) == 6
+    assert sa.load_records(str(tmp_path), tickers=["TCS"])['ticker'].tolist() == ["TCS.NS"] * 3
+
+
+def test_interrupted_compaction_does_not_duplicate_rows(tmp_path, monkeypatch):
+    for _ in range(2):
+        sa.append_run_records([_record("ITC.NS", 30)], str(tmp_path))
+    monkeypatch.setattr(sa, "_remove_covered_parts", lambda partition_path: None)
+
+    sa.compact_partitions(str(tmp_path))
+
+    assert len(_part_files(str(tmp_path))) == 3
+    assert len(sa.load_records(str(tmp_path))) == 2
+    monkeypatch.undo()
+    sa.compact_partitions(str(tmp_path))
+    assert len(_part_files(str(tmp_path))) == 1
+    assert len(sa.load_records(str(tmp_path))) == 2